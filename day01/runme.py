@@ -21,10 +21,21 @@ $ python3 runme.py input.txt
 or
 $ runme.py input.txt
 (where input.txt is the input file and $ the prompt)
+
+for huge inputs, split the file in chunks and scan them in parallel:
+$ python3 runme.py --workers 8 input.txt
+
+or stream the directions in through stdin:
+$ cat input.txt | python3 runme.py -
 """
 
 
 import sys
+import os
+import mmap
+import argparse
+import itertools
+import concurrent.futures
 
 
 char_to_floor_change = { '(': 1, ')': -1 }
@@ -44,16 +55,143 @@ def solve_part_2(input_):
             return char_position
 
 
-def main(filename=None):
+# the chunked engine works on raw bytes; any byte that isn't a parenthesis
+# (e.g. a trailing newline) leaves the floor unchanged
+byte_to_floor_change = [0] * 256
+for char, floor_change in char_to_floor_change.items():
+    byte_to_floor_change[ord(char)] = floor_change
+
+
+default_chunk_size = 16 * 1024 * 1024
+
+
+def chunk_bounds(file_size, chunk_size=default_chunk_size):
+    # split [0, file_size) into consecutive (start, end) byte ranges
+    return [(start, min(start + chunk_size, file_size))
+            for start in range(0, file_size, chunk_size)]
+
+
+def summarize_chunk(filename, start, end):
+    # return the chunk's net floor change and the lowest floor reached
+    # inside it, both relative to the floor Santa was on when he entered it
+    with open(filename, 'rb') as file_:
+        with mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            chunk = data[start:end]
+    net_change = chunk.count(b'(') - chunk.count(b')')
+    # running floor after every character; accumulate and min both run in C
+    prefix_floors = itertools.accumulate(
+        map(byte_to_floor_change.__getitem__, chunk))
+    lowest_floor = min(prefix_floors, default=0)
+    return net_change, lowest_floor
+
+
+def find_basement_in_chunk(chunk, starting_floor):
+    current_floor = starting_floor
+    for char_position, byte in enumerate(chunk, start=1):
+        current_floor += byte_to_floor_change[byte]
+        if current_floor == -1:
+            return char_position
+
+
+def solve_chunked(filename, num_workers=None, chunk_size=default_chunk_size):
+    # solve both parts without loading the whole file; every worker
+    # summarizes a chunk and then we only re-scan the single chunk where
+    # Santa first enters the basement
+    file_size = os.path.getsize(filename)
+    if file_size == 0:
+        return 0, None
+    bounds = chunk_bounds(file_size, chunk_size)
+    with concurrent.futures.ProcessPoolExecutor(num_workers) as executor:
+        summaries = list(executor.map(summarize_chunk,
+                                      itertools.repeat(filename),
+                                      *zip(*bounds)))
+    final_floor = sum(net_change for net_change, _ in summaries)
+    basement_position = None
+    current_floor = 0
+    for (start, end), (net_change, lowest_floor) in zip(bounds, summaries):
+        if current_floor + lowest_floor <= -1:
+            with open(filename, 'rb') as file_:
+                with mmap.mmap(file_.fileno(), 0,
+                               access=mmap.ACCESS_READ) as data:
+                    chunk = data[start:end]
+            basement_position = start + find_basement_in_chunk(chunk,
+                                                               current_floor)
+            break
+        current_floor += net_change
+    return final_floor, basement_position
+
+
+class FloorTracker:
+    # keeps track of Santa's floor as directions arrive in pieces, so we
+    # never need more than one block of input in memory
+    def __init__(self):
+        self.current_floor = 0
+        self.num_chars_seen = 0
+        # position of the first character that takes Santa to the basement
+        self.basement_position = None
+    
+    def feed(self, block):
+        if isinstance(block, str):
+            block = block.encode('ascii')
+        if self.basement_position is None:
+            # only walk the block char by char if it can reach the basement
+            lowest_floor = min(itertools.accumulate(
+                map(byte_to_floor_change.__getitem__, block)), default=0)
+            if self.current_floor + lowest_floor <= -1:
+                position_in_block = find_basement_in_chunk(block,
+                                                           self.current_floor)
+                self.basement_position = (self.num_chars_seen +
+                                          position_in_block)
+        self.current_floor += block.count(b'(') - block.count(b')')
+        self.num_chars_seen += len(block)
+
+
+default_block_size = 64 * 1024
+
+
+def solve_streaming(file_, block_size=default_block_size):
+    # `file_` must be opened in binary mode (e.g. sys.stdin.buffer)
+    tracker = FloorTracker()
+    for block in iter(lambda: file_.read(block_size), b''):
+        tracker.feed(block)
+    return tracker.current_floor, tracker.basement_position
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='runme.py')
+    parser.add_argument('input_file', help="the input file, or '-' to read "
+                                           "from stdin")
+    parser.add_argument('--workers', type=int, default=None,
+                        help='scan the input in parallel chunks using this '
+                             'many processes')
+    return parser.parse_args(args)
+
+
+def main(filename=None, num_workers=None):
     # get the input file
     if filename is None:
-        if len(sys.argv) == 2:
-            # get the filename from the command line
-            filename = sys.argv[1]
+        if len(sys.argv) >= 2:
+            # get the filename (and options) from the command line
+            args = parse_args(sys.argv[1:])
+            filename = args.input_file
+            num_workers = args.workers
         else:
             # no filename given
-            print('Usage: runme.py input_file')
+            print('Usage: runme.py [--workers N] input_file')
             return 1
+    if filename == '-':
+        # read the directions from stdin, one block at a time
+        answer_to_part_1, answer_to_part_2 = solve_streaming(sys.stdin.buffer)
+        print('part 1:', answer_to_part_1)
+        print('part 2:', answer_to_part_2)
+        return 0
+    if num_workers is not None:
+        # huge inputs: use the chunked, multi-process engine
+        answer_to_part_1, answer_to_part_2 = solve_chunked(filename,
+                                                           num_workers)
+        print('part 1:', answer_to_part_1)
+        print('part 2:', answer_to_part_2)
+        return 0
     with open(filename, 'r') as file_:
         # read the file ...
         input_ = file_.read()
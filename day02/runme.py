@@ -21,10 +21,23 @@ $ python3 runme.py input.txt
 or
 $ runme.py input.txt
 (where input.txt is the input file and $ the prompt)
+
+for huge inputs, stream the file in shards through a pool of processes:
+$ python3 runme.py --workers 8 input.txt
 """
 
 
 import sys
+import os
+import argparse
+import itertools
+import concurrent.futures
+
+try:
+    import numpy
+except ImportError:
+    # no numpy; we'll fall back to the pure-python solution
+    numpy = None
 
 
 # tried to be a bit python-beginner and programming-beginner friendly in this
@@ -55,16 +68,130 @@ def solve_part_2(presents):
     return total_needed_ribbon
 
 
-def main(filename=None):
+# vectorized versions of the above; they need numpy
+
+
+def parse_presents_array(file_):
+    # parse all 'LxWxH' lines straight into an (N, 3) integer array
+    presents = numpy.loadtxt(file_, delimiter='x', dtype=numpy.int64,
+                             ndmin=2)
+    return presents.reshape(-1, 3)
+
+
+def solve_both_parts_vectorized(presents):
+    # sort each present's dimensions so the smallest side is always (a, b)
+    a, b, c = numpy.sort(presents, axis=1).T
+    ab, bc, ca = a * b, b * c, c * a
+    total_needed_wrapping_paper = (2 * (ab + bc + ca) + ab).sum()
+    total_needed_ribbon = (2 * (a + b) + ab * c).sum()
+    return int(total_needed_wrapping_paper), int(total_needed_ribbon)
+
+
+# streaming, multi-process versions of the above; memory use depends on the
+# shard and batch sizes, not on the size of the file
+
+
+default_shard_size = 16 * 1024 * 1024
+
+
+def shard_bounds(filename, shard_size=default_shard_size):
+    # split the file into (start, end) byte ranges that begin and end on
+    # line boundaries
+    file_size = os.path.getsize(filename)
+    bounds = []
+    with open(filename, 'rb') as file_:
+        start = 0
+        while start < file_size:
+            file_.seek(min(start + shard_size, file_size))
+            # move on to the start of the next line
+            file_.readline()
+            end = min(file_.tell(), file_size)
+            bounds.append((start, end))
+            start = end
+    return bounds
+
+
+def read_presents(file_, num_bytes):
+    # yield the presents found in the next `num_bytes` bytes of `file_`
+    while num_bytes > 0:
+        line = file_.readline()
+        if not line:
+            break
+        num_bytes -= len(line)
+        line = line.strip()
+        if line:
+            sl, sw, sh = line.split(b'x')
+            yield (int(sl), int(sw), int(sh))
+
+
+def solve_shard(filename, start, end, batch_size=10000):
+    # return the paper and ribbon needed for the presents in [start, end)
+    total_needed_wrapping_paper = 0
+    total_needed_ribbon = 0
+    with open(filename, 'rb') as file_:
+        file_.seek(start)
+        presents = read_presents(file_, end - start)
+        while True:
+            batch = list(itertools.islice(presents, batch_size))
+            if not batch:
+                break
+            total_needed_wrapping_paper += solve_part_1(batch)
+            total_needed_ribbon += solve_part_2(batch)
+    return total_needed_wrapping_paper, total_needed_ribbon
+
+
+def solve_sharded(filename, num_workers=None,
+                  shard_size=default_shard_size):
+    bounds = shard_bounds(filename, shard_size)
+    total_needed_wrapping_paper = 0
+    total_needed_ribbon = 0
+    with concurrent.futures.ProcessPoolExecutor(num_workers) as executor:
+        partial_sums = executor.map(solve_shard,
+                                    itertools.repeat(filename),
+                                    *zip(*bounds))
+        for needed_wrapping_paper, needed_ribbon in partial_sums:
+            total_needed_wrapping_paper += needed_wrapping_paper
+            total_needed_ribbon += needed_ribbon
+    return total_needed_wrapping_paper, total_needed_ribbon
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='runme.py')
+    parser.add_argument('input_file')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='stream the input in shards using this many '
+                             'processes')
+    return parser.parse_args(args)
+
+
+def main(filename=None, num_workers=None):
     # get the input file
     if filename is None:
-        if len(sys.argv) == 2:
-            # get the filename from the command line
-            filename = sys.argv[1]
+        if len(sys.argv) >= 2:
+            # get the filename (and options) from the command line
+            args = parse_args(sys.argv[1:])
+            filename = args.input_file
+            num_workers = args.workers
         else:
             # no filename given
-            print('Usage: runme.py input_file')
+            print('Usage: runme.py [--workers N] input_file')
             return 1
+    if num_workers is not None:
+        # huge inputs: stream the file in shards through a process pool
+        answer_to_part_1, answer_to_part_2 = solve_sharded(filename,
+                                                           num_workers)
+        print('part 1:', answer_to_part_1)
+        print('part 2:', answer_to_part_2)
+        return 0
+    if numpy is not None:
+        # parse the file into an array and solve both parts in one go
+        with open(filename, 'r') as file_:
+            presents = parse_presents_array(file_)
+        answer_to_part_1, answer_to_part_2 = \
+            solve_both_parts_vectorized(presents)
+        print('part 1:', answer_to_part_1)
+        print('part 2:', answer_to_part_2)
+        return 0
     # parse the file ...
     with open(filename, 'r') as file_:
         presents = list()
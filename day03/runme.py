@@ -21,14 +21,31 @@ $ python3 runme.py input.txt
 or
 $ runme.py input.txt
 (where input.txt is the input file and $ the prompt)
+
+for walks that don't fit in memory, spill visited houses to disk:
+$ python3 runme.py --memory-budget 512 input.txt
+(where 512 is roughly how many MiB of memory to use)
 """
 
 
 import sys
+import os
+import array
+import argparse
+import tempfile
+import concurrent.futures
+
+try:
+    import numpy
+except ImportError:
+    # no numpy; `solve_k_walkers` will fall back to using Santa objects
+    numpy = None
 
 
 # a class that represents positions (points) on the 2d grid
 class Position:
+    __slots__ = ('x', 'y')
+    
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -38,6 +55,19 @@ class Position:
     
     def __str__(self):
         return '{},{}'.format(self.x, self.y)
+    
+    def key(self):
+        # pack both coordinates in a single int; works for |y| < 2**31
+        return (self.x << y_bits) + self.y
+    
+    @classmethod
+    def from_key(cls, key):
+        # undo `key`; round y to the nearest multiple of 2**y_bits
+        x = (key + (1 << (y_bits - 1))) >> y_bits
+        return cls(x, key - (x << y_bits))
+
+
+y_bits = 32
 
 
 Move = Position
@@ -51,27 +81,42 @@ direction_to_move = {
 }
 
 
+# how each move changes a position's packed int key
+direction_to_key_change = {
+    direction: move.key() for direction, move in direction_to_move.items()
+}
+
+
 class Santa:
     def __init__(self, memory=None):
-        # Santa's starting position
-        self.current_position = Position(0, 0)
+        # Santa's starting position (packed in an int, see `Position.key`)
+        self.current_key = Position(0, 0).key()
         # Santa's memory - he remembers every house (position) he's visited
         if memory is None:
             self.memory = set()
         else:
             self.memory = memory
-        self.memory.add(str(self.current_position))
-        # NOTE: I could do this using tuples instead of Positions, which
-        #   would save me from having to store positions as strings in the
-        #   memory, but I wanted to overload positions' "+" operator for fun
+        self.memory.add(self.current_key)
+        # NOTE: we store houses as packed ints instead of Positions or
+        #   strings; one small int per house uses several times less memory
+        #   and adding to the key is much faster than building a Position
+    
+    @property
+    def current_position(self):
+        return Position.from_key(self.current_key)
     
     def feed_directions(self, directions):
+        key_change = direction_to_key_change
+        memory_add = self.memory.add
+        current_key = self.current_key
         for direction in directions:
-            self.move(direction)
+            current_key += key_change[direction]
+            memory_add(current_key)
+        self.current_key = current_key
     
     def move(self, direction):
-        self.current_position += direction_to_move[direction]
-        self.memory.add(str(self.current_position))
+        self.current_key += direction_to_key_change[direction]
+        self.memory.add(self.current_key)
     
     def number_of_distinct_houses_visited(self):
         return len(self.memory)
@@ -101,16 +146,162 @@ def solve_part_2(directions):
     return len(common_memory)
 
 
-def main(filename=None):
+def solve_k_walkers(directions, k):
+    # generalization of part 2 for a fleet of k walkers (k == 2 is Santa
+    # and robo-Santa); walker i follows directions i, i + k, i + 2k etc
+    # - chars that aren't directions (e.g. newlines) are skipped, without
+    #   using up a turn
+    if numpy is None:
+        directions = [direction for direction in directions
+                      if direction in direction_to_key_change]
+        common_memory = set()
+        for i in range(k):
+            Santa(memory=common_memory).feed_directions(directions[i::k])
+        return len(common_memory)
+    # map every direction to its x and y change
+    dx_for = numpy.zeros(256, dtype=numpy.int64)
+    dy_for = numpy.zeros(256, dtype=numpy.int64)
+    is_direction = numpy.zeros(256, dtype=bool)
+    for direction, move in direction_to_move.items():
+        dx_for[ord(direction)] = move.x
+        dy_for[ord(direction)] = move.y
+        is_direction[ord(direction)] = True
+    # (non-ascii chars become '?', which isn't a direction either)
+    chars = numpy.frombuffer(directions.encode('ascii', 'replace'),
+                             dtype=numpy.uint8)
+    chars = chars[is_direction[chars]]
+    # pad with "don't move" so every walker gets the same number of moves
+    chars = numpy.concatenate(
+        (chars, numpy.zeros(-len(chars) % k, dtype=numpy.uint8)))
+    # row j holds the j-th move of every walker; the cumulative sum down
+    # each column is that walker's path
+    xs = numpy.cumsum(dx_for[chars].reshape(-1, k), axis=0)
+    ys = numpy.cumsum(dy_for[chars].reshape(-1, k), axis=0)
+    # pack the coordinates like `Position.key` and count distinct houses,
+    # including the starting house
+    keys = numpy.append((xs << y_bits) + ys, Position(0, 0).key())
+    return int(numpy.unique(keys).size)
+
+
+# out-of-core versions of the above for walks larger than RAM: phase 1 walks
+# and hash-partitions every visited house into shard files on disk, phase 2
+# counts the distinct houses of each shard in parallel
+
+
+# rough memory cost of counting one visit in a shard: 8 bytes in the array
+# read from disk plus (at worst, if it's a new house) ~64 bytes in the set
+bytes_per_visit = 72
+
+
+def choose_num_shards(max_num_visits, memory_budget, num_workers):
+    # pick enough shards that `num_workers` shards can be counted at the
+    # same time and still fit in the budget
+    budget_per_worker = max(1, memory_budget // num_workers)
+    return max(1, -(-max_num_visits * bytes_per_visit // budget_per_worker))
+
+
+# odd 64-bit multiplier (2**64 / golden ratio) for mixing keys
+key_multiplier = 0x9E3779B97F4A7C15
+
+
+def shard_for(key, num_shards):
+    # keys pack y in their low bits, so `key % num_shards` would split
+    # houses by y alone whenever num_shards divides 2**32; mix all the bits
+    # by multiplying and pick the shard from the high bits of the product
+    mixed = (key * key_multiplier) & 0xFFFFFFFFFFFFFFFF
+    return (mixed * num_shards) >> 64
+
+
+def spill_walk_to_shards(file_, shard_filenames, num_walkers=1,
+                         block_size=64 * 1024, buffer_size=64 * 1024):
+    # walk the directions read from `file_` and append every visited house's
+    # key to shard file `shard_for(key, num_shards)`
+    num_shards = len(shard_filenames)
+    buffers = [array.array('q') for _ in range(num_shards)]
+    
+    def flush(shard):
+        # shard files are only opened while flushing, so any number of
+        # shards works without running out of file descriptors
+        with open(shard_filenames[shard], 'ab') as shard_file:
+            buffers[shard].tofile(shard_file)
+        del buffers[shard][:]
+    
+    def visit(key):
+        shard = shard_for(key, num_shards)
+        buffers[shard].append(key)
+        if len(buffers[shard]) >= buffer_size:
+            flush(shard)
+    
+    current_keys = [Position(0, 0).key()] * num_walkers
+    visit(current_keys[0])
+    walker = 0
+    for block in iter(lambda: file_.read(block_size), ''):
+        for direction in block:
+            try:
+                key_change = direction_to_key_change[direction]
+            except KeyError:
+                # not a direction (e.g. a trailing newline)
+                continue
+            current_keys[walker] += key_change
+            visit(current_keys[walker])
+            walker = (walker + 1) % num_walkers
+    for shard in range(num_shards):
+        flush(shard)
+
+
+def count_distinct_in_shard(shard_filename):
+    keys = array.array('q')
+    with open(shard_filename, 'rb') as shard_file:
+        keys.frombytes(shard_file.read())
+    return len(set(keys))
+
+
+def solve_out_of_core(filename, num_walkers=1, memory_budget=512 * 2**20,
+                      num_workers=None):
+    # there's one visit per move (plus the starting house)
+    max_num_visits = os.path.getsize(filename) + 1
+    num_workers = num_workers or os.cpu_count() or 1
+    num_shards = choose_num_shards(max_num_visits, memory_budget, num_workers)
+    # the spill buffers (8 bytes per key) have to fit in the budget too
+    buffer_size = max(1, min(64 * 1024, memory_budget // (8 * num_shards)))
+    with tempfile.TemporaryDirectory(prefix='day03-') as shard_dir:
+        shard_filenames = [os.path.join(shard_dir, 'shard-{}'.format(i))
+                           for i in range(num_shards)]
+        with open(filename, 'r') as file_:
+            spill_walk_to_shards(file_, shard_filenames, num_walkers,
+                                 buffer_size=buffer_size)
+        with concurrent.futures.ProcessPoolExecutor(num_workers) as executor:
+            return sum(executor.map(count_distinct_in_shard,
+                                    shard_filenames))
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='runme.py')
+    parser.add_argument('input_file')
+    parser.add_argument('--memory-budget', type=int, default=None,
+                        help='spill visited houses to disk and count them '
+                             'using roughly this many MiB of memory')
+    return parser.parse_args(args)
+
+
+def main(filename=None, memory_budget=None):
     # get the input file
     if filename is None:
-        if len(sys.argv) == 2:
-            # get the filename from the command line
-            filename = sys.argv[1]
+        if len(sys.argv) >= 2:
+            # get the filename (and options) from the command line
+            args = parse_args(sys.argv[1:])
+            filename = args.input_file
+            if args.memory_budget is not None:
+                memory_budget = args.memory_budget * 2**20
         else:
             # no filename given
-            print('Usage: runme.py input_file')
+            print('Usage: runme.py [--memory-budget MiB] input_file')
             return 1
+    if memory_budget is not None:
+        # huge walks: count the visited houses out of core
+        print('part 1:', solve_out_of_core(filename, 1, memory_budget))
+        print('part 2:', solve_out_of_core(filename, 2, memory_budget))
+        return 0
     with open(filename, 'r') as file_:
         # read the file ...
         directions = file_.read()
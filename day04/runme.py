@@ -21,48 +21,280 @@ $ python3 runme.py input.txt
 or
 $ runme.py input.txt
 (where input.txt is the input file and $ the prompt)
+
+to search using several processes:
+$ python3 runme.py --workers 8 input.txt
+
+to save progress to (and resume from) a checkpoint file:
+$ python3 runme.py --checkpoint checkpoints.json input.txt
 """
 
 
 import sys
+import os
 import hashlib
+import argparse
+import json
+import time
+import itertools
+import multiprocessing
+import concurrent.futures
 
 
 def md5_of(string_):
     return hashlib.md5(string_.encode('utf-8')).hexdigest()
 
 
+def digest_limit(num_zeros):
+    # a 16-byte md5 digest starts with `num_zeros` hex zeros exactly when
+    # (read as a big-endian number) it's smaller than 16**(32 - num_zeros);
+    # equal-length bytes compare the same way numbers do
+    return (1 << (4 * (32 - num_zeros))).to_bytes(16, 'big')
+
+
+def find_nonce(key, num_zeros, start_at=1, stop=None):
+    # return the first nonce in [start_at, stop) whose hash starts with
+    # `num_zeros` zeros (or None if there's none)
+    # - hash the key once and copy that state for every nonce
+    # - compare raw digests instead of building hexdigest strings
+    key_hash = hashlib.md5(key.encode('utf-8'))
+    copy = key_hash.copy
+    limit = digest_limit(num_zeros)
+    nums = itertools.count(start_at) if stop is None else range(start_at,
+                                                                stop)
+    for num in nums:
+        hash_ = copy()
+        hash_.update(b'%d' % num)
+        if hash_.digest() < limit:
+            return num
+    return None
+
+
 def solve_part_1(key):
-    five_zeros = '00000'
-    num = 1
-    while md5_of(key + str(num))[:5] != five_zeros:
-        num += 1
-    return num
+    return find_nonce(key, 5)
 
 
 def solve_part_2(key, start_at=1):
-    six_zeros = '000000'
+    return find_nonce(key, 6, start_at=start_at)
+
+
+class CheckpointStore:
+    # a json file that remembers, for every (key, difficulty), the highest
+    # nonce N such that no nonce in [1, N] matches, plus the hit (the first
+    # matching nonce) once one is found
+    def __init__(self, filename):
+        self.filename = filename
+        try:
+            with open(filename, 'r') as file_:
+                self._records = json.load(file_)
+        except FileNotFoundError:
+            self._records = {}
+    
+    @staticmethod
+    def _record_name(key, difficulty):
+        return '{}:{}'.format(key, difficulty)
+    
+    def get(self, key, difficulty):
+        # return (checked_up_to, hit); hit is None if none's been found yet
+        record = self._records.get(self._record_name(key, difficulty), {})
+        return record.get('checked_up_to', 0), record.get('hit')
+    
+    def update(self, key, difficulty, checked_up_to, hit=None):
+        self._records[self._record_name(key, difficulty)] = {
+            'checked_up_to': checked_up_to, 'hit': hit}
+    
+    def save(self):
+        # write to a temporary file first so a crash can't corrupt the store
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as file_:
+            json.dump(self._records, file_, indent=2, sort_keys=True)
+        os.replace(temp_filename, self.filename)
+
+
+def find_nonces(key, difficulties, start_at=1, progress_callback=None,
+                report_every=1000000, checkpoint_store=None):
+    # scan the nonces once and return a dict with the first nonce (>=
+    # start_at) for every difficulty (i.e. number of leading zeros) given
+    # - if given, `progress_callback(num, hashes_per_second, hits)` gets
+    #   called after every `report_every` nonces and whenever there's a new
+    #   hit, where `num` is the next nonce to check and `hits` a dict of
+    #   the hits found so far
+    # - if given a `checkpoint_store`, answer from it when possible, resume
+    #   from it, and save progress to it after every `report_every` nonces
+    for difficulty in difficulties:
+        if not 1 <= difficulty <= 32:
+            raise ValueError('difficulty should be between 1 and 32 (the '
+                             'length of an md5 hexdigest), not {}'.format(
+                                 difficulty))
+    key_hash = hashlib.md5(key.encode('utf-8'))
+    copy = key_hash.copy
+    hits = {}
+    pending = sorted(set(difficulties))
     num = start_at
-    while md5_of(key + str(num))[:6] != six_zeros:
+    # only record progress if everything below `num` is known to not match
+    record_progress = False
+    if checkpoint_store is not None:
+        checked_up_to = {}
+        for difficulty in pending:
+            checked, hit = checkpoint_store.get(key, difficulty)
+            if hit is not None and hit >= start_at:
+                # a finished search
+                hits[difficulty] = hit
+            else:
+                checked_up_to[difficulty] = checked if hit is None else 0
+        pending = [d for d in pending if d not in hits]
+        resume_at = min(checked_up_to.values(), default=0) + 1
+        if start_at <= resume_at:
+            num = resume_at
+            record_progress = True
+    
+    def save_progress():
+        for difficulty in set(difficulties):
+            if difficulty in hits:
+                checkpoint_store.update(key, difficulty, hits[difficulty] - 1,
+                                        hits[difficulty])
+            else:
+                checkpoint_store.update(
+                    key, difficulty, max(checked_up_to[difficulty], num - 1))
+        checkpoint_store.save()
+    
+    while pending:
+        # a hash can only satisfy any difficulty if it satisfies the easiest
+        limit = digest_limit(pending[0])
+        block_start = num
+        started = time.perf_counter()
+        for num in range(block_start, block_start + report_every):
+            hash_ = copy()
+            hash_.update(b'%d' % num)
+            digest = hash_.digest()
+            if digest < limit:
+                for difficulty in pending:
+                    if digest < digest_limit(difficulty):
+                        hits[difficulty] = num
+                pending = [d for d in pending if d not in hits]
+                break
         num += 1
-    return num
+        if record_progress:
+            # if we get interrupted we'll lose at most this one block
+            save_progress()
+        if progress_callback is not None:
+            elapsed = time.perf_counter() - started
+            hashes_per_second = (num - block_start) / elapsed if elapsed else 0
+            progress_callback(num, hashes_per_second, dict(hits))
+    if record_progress:
+        save_progress()
+    return hits
+
+
+# multi-process search: workers get batches (ranges) of nonces and share the
+# lowest hit found so far, so they can give up on batches that can no longer
+# contain the answer
+
+
+# set in every worker process by `init_worker`; 0 means no hit yet
+lowest_hit = None
+
+
+def init_worker(shared_lowest_hit):
+    global lowest_hit
+    lowest_hit = shared_lowest_hit
+
+
+def search_batch(key, num_zeros, start, stop, check_every=4096):
+    # return the first nonce in [start, stop) that works, or None
+    for sub_start in range(start, stop, check_every):
+        if 0 < lowest_hit.value < sub_start:
+            # someone already found a smaller nonce
+            return None
+        num = find_nonce(key, num_zeros, sub_start,
+                         min(sub_start + check_every, stop))
+        if num is not None:
+            return num
+    return None
+
+
+def find_nonce_parallel(key, num_zeros, start_at=1, num_workers=None,
+                        batch_size=100000):
+    # return the lowest nonce >= start_at whose hash starts with `num_zeros`
+    # zeros, even if a later batch finishes first
+    num_workers = num_workers or os.cpu_count()
+    shared_lowest_hit = multiprocessing.Value('q', 0)
+    best = None
+    next_start = start_at
+    in_flight = {}
+    with concurrent.futures.ProcessPoolExecutor(
+            num_workers, initializer=init_worker,
+            initargs=(shared_lowest_hit,)) as executor:
+        while True:
+            # keep every worker busy with batches that may still hold the
+            # answer (i.e. ones that start below the best hit so far)
+            while (len(in_flight) < 2 * num_workers and
+                    (best is None or next_start < best)):
+                future = executor.submit(search_batch, key, num_zeros,
+                                         next_start, next_start + batch_size)
+                in_flight[future] = next_start
+                next_start += batch_size
+            if not in_flight:
+                # every batch below `best` has been searched
+                return best
+            done, _ = concurrent.futures.wait(
+                in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                del in_flight[future]
+                num = future.result()
+                if num is not None and (best is None or num < best):
+                    best = num
+                    shared_lowest_hit.value = num
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='runme.py')
+    parser.add_argument('input_file')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='search using this many processes')
+    parser.add_argument('--checkpoint', default=None,
+                        help='save progress to (and resume from) this file')
+    parsed_args = parser.parse_args(args)
+    if parsed_args.workers is not None and parsed_args.checkpoint is not None:
+        # the multi-process search doesn't keep checkpoints
+        parser.error('--workers and --checkpoint can not be used together')
+    return parsed_args
 
 
-def main(filename=None):
+def main(filename=None, num_workers=None, checkpoint_filename=None):
     # get the input file
     if filename is None:
-        if len(sys.argv) == 2:
-            # get the filename from the command line
-            filename = sys.argv[1]
+        if len(sys.argv) >= 2:
+            # get the filename (and options) from the command line
+            args = parse_args(sys.argv[1:])
+            filename = args.input_file
+            num_workers = args.workers
+            checkpoint_filename = args.checkpoint
         else:
             # no filename given
-            print('Usage: runme.py input_file')
+            print('Usage: runme.py [--workers N] [--checkpoint FILE] '
+                  'input_file')
             return 1
+    if num_workers is not None and checkpoint_filename is not None:
+        raise ValueError("the multi-process search doesn't keep checkpoints")
     with open(filename, 'r') as file_:
         secret_key = file_.read().strip()
-    answer_to_part_1 = solve_part_1(secret_key)
-    print('part 1:', answer_to_part_1)
-    print('part 2:', solve_part_2(secret_key, start_at=answer_to_part_1))
+    if num_workers is not None:
+        answer_to_part_1 = find_nonce_parallel(secret_key, 5,
+                                               num_workers=num_workers)
+        print('part 1:', answer_to_part_1)
+        print('part 2:', find_nonce_parallel(secret_key, 6,
+                                             start_at=answer_to_part_1,
+                                             num_workers=num_workers))
+        return 0
+    checkpoint_store = None
+    if checkpoint_filename is not None:
+        checkpoint_store = CheckpointStore(checkpoint_filename)
+    # find the nonces for both parts in a single scan
+    nonces = find_nonces(secret_key, [5, 6],
+                         checkpoint_store=checkpoint_store)
+    print('part 1:', nonces[5])
+    print('part 2:', nonces[6])
     return 0
 
 
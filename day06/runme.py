@@ -25,7 +25,17 @@ $ runme.py input.txt
 
 
 import sys
+import os
 import re
+import mmap
+import shutil
+import struct
+
+try:
+    import numpy
+except ImportError:
+    # no numpy; we'll fall back to the cell-by-cell `Grid`
+    numpy = None
 
 
 # did this using classes just for the fun of it
@@ -36,7 +46,7 @@ class BadInstructionError(Exception):
         self.instruction = instruction
     
     def __str__(self):
-        return str(instruction)
+        return str(self.instruction)
 
 
 class Instruction:
@@ -59,30 +69,261 @@ class Instruction:
             raise BadInstructionError(string)
 
 
+# file-backed grids start with a header holding their cell type, width and
+# height, plus the number of instructions applied to them
+header = struct.Struct('<8sQQQ')
+
+
+# the memoryview format used to store each type of cell; 'bit' cells are
+# packed 8 to a byte
+format_for_cell_type = {
+    'bit': 'B',
+    'uint8': 'B',
+    'uint16': 'H',
+    'uint32': 'I',
+}
+
+
 class Grid:
-    def __init__(self):
-        self._grid = [[0] * 1000 for i in range(1000)]
+    # (a class variable)
+    # Grid methods update a single cell per call
+    takes_rectangles = False
+    
+    def __init__(self, width=1000, height=1000, cell_type='uint32',
+                 filename=None):
+        # - `cell_type` should be able to hold the brightest light; storing
+        #   a value that doesn't fit raises a ValueError
+        # - if a `filename` is given the cells live in that (memory-mapped)
+        #   file instead of in memory; the file also records how many
+        #   instructions its cells reflect, so a grid checkpointed by
+        #   `InstructionApplier.apply_all` can be picked up again
+        self.width = width
+        self.height = height
+        self.cell_type = cell_type
+        self.filename = filename
+        self._format = format_for_cell_type[cell_type]
+        num_cells = width * height
+        if cell_type == 'bit':
+            self._num_bytes = (num_cells + 7) // 8
+            # bit cells need the (slower) bit-twiddling versions
+            for name in ('toggle', 'turn_on', 'turn_off',
+                         'increase_brightness_by_1',
+                         'decrease_brightness_by_1',
+                         'increase_brightness_by_2'):
+                setattr(self, name, getattr(self, '_' + name + '_bit'))
+        else:
+            self._num_bytes = num_cells * struct.calcsize(self._format)
+        self._mmap = None
+        self.instructions_applied = 0
+        if filename is None:
+            self._cells = memoryview(bytearray(self._num_bytes)).cast(
+                self._format)
+        else:
+            with open(filename, 'a+b') as file_:
+                file_.seek(0)
+                stored_header = file_.read(header.size)
+                if not stored_header:
+                    # a new file: write the header, then make room for the
+                    # (zeroed) cells
+                    file_.write(self._pack_header(0))
+                    file_.truncate(header.size + self._num_bytes)
+                elif len(stored_header) < header.size:
+                    raise ValueError(
+                        '{} is not a grid file'.format(filename))
+                else:
+                    self._check_header(stored_header)
+            self._map(filename)
+            _, _, _, self.instructions_applied = header.unpack_from(
+                self._mmap)
+    
+    def _pack_header(self, instructions_applied):
+        return header.pack(self.cell_type.encode('ascii'), self.width,
+                           self.height, instructions_applied)
+    
+    def _check_header(self, stored_header):
+        # refuse to reinterpret another grid's cells
+        cell_type, width, height, _ = header.unpack(stored_header)
+        cell_type = cell_type.rstrip(b'\0').decode('ascii')
+        if (cell_type, width, height) != (self.cell_type, self.width,
+                                          self.height):
+            raise ValueError(
+                '{} holds a {}x{} grid of {} cells, not a {}x{} grid of {} '
+                'cells'.format(self.filename, width, height, cell_type,
+                               self.width, self.height, self.cell_type))
+    
+    def _map(self, filename):
+        with open(filename, 'r+b') as file_:
+            self._mmap = mmap.mmap(file_.fileno(),
+                                   header.size + self._num_bytes)
+        with memoryview(self._mmap) as buffer_:
+            self._cells = buffer_[header.size:].cast(self._format)
+    
+    def _unmap(self):
+        self._cells.release()
+        self._mmap.close()
+    
+    def _get_bit(self, index):
+        return (self._cells[index >> 3] >> (index & 7)) & 1
+    
+    def _set_bit(self, index, value):
+        if value not in (0, 1):
+            raise ValueError('a bit cell can only hold 0 or 1')
+        if value:
+            self._cells[index >> 3] |= 1 << (index & 7)
+        else:
+            self._cells[index >> 3] &= ~(1 << (index & 7)) & 0xff
+    
+    def _row(self, row):
+        start = row * self.width
+        if self.cell_type == 'bit':
+            return [self._get_bit(index)
+                    for index in range(start, start + self.width)]
+        return self._cells[start:start + self.width]
     
     def toggle(self, row, col):
-        self._grid[row][col] = int(not self._grid[row][col])
+        cells, index = self._cells, row * self.width + col
+        cells[index] = int(not cells[index])
     
     def turn_on(self, row, col):
-        self._grid[row][col] = 1
+        self._cells[row * self.width + col] = 1
     
     def turn_off(self, row, col):
-        self._grid[row][col] = 0
+        self._cells[row * self.width + col] = 0
     
     def increase_brightness_by_1(self, row, col):
-        self._grid[row][col] += 1
+        self._cells[row * self.width + col] += 1
     
     def decrease_brightness_by_1(self, row, col):
-        self._grid[row][col] = max(self._grid[row][col] - 1, 0)
+        cells, index = self._cells, row * self.width + col
+        if cells[index]:
+            cells[index] -= 1
     
     def increase_brightness_by_2(self, row, col):
-        self._grid[row][col] += 2
+        self._cells[row * self.width + col] += 2
+    
+    # the same, for bit cells
+    
+    def _toggle_bit(self, row, col):
+        index = row * self.width + col
+        self._cells[index >> 3] ^= 1 << (index & 7)
+    
+    def _turn_on_bit(self, row, col):
+        index = row * self.width + col
+        self._cells[index >> 3] |= 1 << (index & 7)
+    
+    def _turn_off_bit(self, row, col):
+        index = row * self.width + col
+        self._cells[index >> 3] &= ~(1 << (index & 7)) & 0xff
+    
+    def _increase_brightness_by_1_bit(self, row, col):
+        index = row * self.width + col
+        self._set_bit(index, self._get_bit(index) + 1)
+    
+    def _decrease_brightness_by_1_bit(self, row, col):
+        self._turn_off_bit(row, col)
+    
+    def _increase_brightness_by_2_bit(self, row, col):
+        index = row * self.width + col
+        self._set_bit(index, self._get_bit(index) + 2)
     
     def total_brightness(self):
-        return sum(sum(row) for row in self._grid)
+        if self.cell_type == 'bit':
+            # count the 1 bits, a megabyte at a time
+            chunk_size = 2**20
+            return sum(
+                bin(int.from_bytes(self._cells[i:i + chunk_size], 'little'))
+                    .count('1')
+                for i in range(0, len(self._cells), chunk_size))
+        return sum(self._cells)
+    
+    def weighted_brightness(self, row_weights, col_weights):
+        # total brightness if cell (row, col) stood for
+        # row_weights[row] * col_weights[col] lights
+        return sum(row_weight * sum(map(int.__mul__, self._row(row),
+                                        col_weights))
+                   for row, row_weight in enumerate(row_weights))
+    
+    def _work_filename(self):
+        return self.filename + '.work'
+    
+    def begin_batch(self):
+        # file-backed grids apply every batch of instructions to a copy of
+        # the file, which `checkpoint` then swaps in; if we get interrupted
+        # mid-batch the file still holds the last checkpoint, untouched
+        # NOTE: this copies the whole file once per batch, so bigger
+        #   batches mean less copying but more work to redo after a crash
+        if self._mmap is None:
+            return
+        self._unmap()
+        shutil.copyfile(self.filename, self._work_filename())
+        self._map(self._work_filename())
+    
+    def checkpoint(self, instructions_applied):
+        # record that the cells reflect the first `instructions_applied`
+        # instructions; for file-backed grids, also flush the batch's copy
+        # and atomically replace the file with it
+        self.instructions_applied = instructions_applied
+        if self._mmap is None:
+            return
+        self._mmap[:header.size] = self._pack_header(instructions_applied)
+        self._mmap.flush()
+        if os.path.exists(self._work_filename()):
+            self._unmap()
+            os.replace(self._work_filename(), self.filename)
+            self._map(self.filename)
+    
+    def close(self):
+        if self._mmap is None:
+            self._cells.release()
+        else:
+            self._unmap()
+
+
+class ArrayGrid:
+    # same as Grid, but backed by a numpy array; its methods take slices
+    # (`rows`, `cols`) so that every instruction is a single array operation
+    takes_rectangles = True
+    
+    def __init__(self, width=1000, height=1000, dtype=None):
+        if dtype is None:
+            dtype = numpy.int64
+        self._grid = numpy.zeros((height, width), dtype=dtype)
+        # (always in memory; checkpoints only count instructions)
+        self.filename = None
+        self.instructions_applied = 0
+    
+    def toggle(self, rows, cols):
+        self._grid[rows, cols] ^= 1
+    
+    def turn_on(self, rows, cols):
+        self._grid[rows, cols] = 1
+    
+    def turn_off(self, rows, cols):
+        self._grid[rows, cols] = 0
+    
+    def increase_brightness_by_1(self, rows, cols):
+        self._grid[rows, cols] += 1
+    
+    def decrease_brightness_by_1(self, rows, cols):
+        # basic slicing gives a view, so this updates the grid in place
+        view = self._grid[rows, cols]
+        numpy.subtract(view, 1, out=view, where=view > 0)
+    
+    def increase_brightness_by_2(self, rows, cols):
+        self._grid[rows, cols] += 2
+    
+    def total_brightness(self):
+        return int(self._grid.sum())
+    
+    def weighted_brightness(self, row_weights, col_weights):
+        weights = numpy.outer(row_weights, col_weights)
+        return int((self._grid * weights).sum())
+    
+    def begin_batch(self):
+        pass
+    
+    def checkpoint(self, instructions_applied):
+        self.instructions_applied = instructions_applied
 
 
 class InstructionApplier:
@@ -90,15 +331,93 @@ class InstructionApplier:
         self._grid = grid
         self.interpreter = command_interpreter
     
+    def apply_all(self, instructions, checkpoint_every=None):
+        # with `checkpoint_every`, checkpoint the grid after every batch of
+        # that many instructions, and skip the instructions a (file-backed)
+        # grid has already seen; file-backed grids always get checkpointed,
+        # by default after all instructions (as a single batch)
+        if checkpoint_every is None:
+            if getattr(self._grid, 'filename', None) is None:
+                for instruction in instructions:
+                    self.apply_(instruction)
+                return
+            checkpoint_every = max(1, len(instructions))
+        if not hasattr(self._grid, 'checkpoint'):
+            raise TypeError('{} grids do not support checkpoints'.format(
+                type(self._grid).__name__))
+        applied = self._grid.instructions_applied
+        while applied < len(instructions):
+            batch = instructions[applied:applied + checkpoint_every]
+            self._grid.begin_batch()
+            for instruction in batch:
+                self.apply_(instruction)
+            applied += len(batch)
+            self._grid.checkpoint(applied)
+    
+    def apply_(self, ins):
+        # look the grid method up once per instruction, not once per cell
+        grid_method = getattr(self._grid, self.interpreter(ins.command))
+        cols = range(ins.left, ins.right + 1)
+        for row in range(ins.down, ins.up + 1):
+            for col in cols:
+                grid_method(row, col)
+
+
+class RectangleInstructionApplier(InstructionApplier):
+    # for grids (like ArrayGrid) that update a whole rectangle per call
+    def apply_(self, ins):
+        grid_method_name = self.interpreter(ins.command)
+        rows = slice(ins.down, ins.up + 1)
+        cols = slice(ins.left, ins.right + 1)
+        getattr(self._grid, grid_method_name)(rows, cols)
+
+
+class FusedInstructionApplier:
+    # applies every instruction to any number of registered
+    # (grid, command interpreter) pairs, going over each rectangle once
+    def __init__(self, grids_and_interpreters=()):
+        self._targets = []
+        for grid, command_interpreter in grids_and_interpreters:
+            self.register(grid, command_interpreter)
+    
+    def register(self, grid, command_interpreter):
+        self._targets.append((grid, command_interpreter))
+    
     def apply_all(self, instructions):
         for instruction in instructions:
             self.apply_(instruction)
     
     def apply_(self, ins):
-        grid_method_name = self.interpreter(ins.command)
-        for row in range(ins.down, ins.up + 1):
-            for col in range(ins.left, ins.right + 1):
-                getattr(self._grid, grid_method_name)(row, col)
+        cell_methods = []
+        for grid, command_interpreter in self._targets:
+            grid_method = getattr(grid, command_interpreter(ins.command))
+            if grid.takes_rectangles:
+                grid_method(slice(ins.down, ins.up + 1),
+                            slice(ins.left, ins.right + 1))
+            else:
+                cell_methods.append(grid_method)
+        if not cell_methods:
+            return
+        # a single walk over the rectangle for all cell-by-cell grids; the
+        # common one and two grid cases skip the innermost loop
+        rows = range(ins.down, ins.up + 1)
+        cols = range(ins.left, ins.right + 1)
+        if len(cell_methods) == 1:
+            grid_method, = cell_methods
+            for row in rows:
+                for col in cols:
+                    grid_method(row, col)
+        elif len(cell_methods) == 2:
+            first_method, second_method = cell_methods
+            for row in rows:
+                for col in cols:
+                    first_method(row, col)
+                    second_method(row, col)
+        else:
+            for row in rows:
+                for col in cols:
+                    for grid_method in cell_methods:
+                        grid_method(row, col)
 
 
 def interpret_command_in_english(command):
@@ -122,12 +441,349 @@ def interpret_command_in_elvish(command):
 
 
 def solve(instructions, command_interpreter):
-    grid = Grid()
-    instruction_applier = InstructionApplier(grid, command_interpreter)
+    if numpy is not None:
+        grid = ArrayGrid()
+        instruction_applier = RectangleInstructionApplier(grid,
+                                                          command_interpreter)
+    else:
+        grid = Grid()
+        instruction_applier = InstructionApplier(grid, command_interpreter)
     instruction_applier.apply_all(instructions)
     return grid.total_brightness()
 
 
+# range-query grids: 2d segment trees (quadtrees) with lazy propagation for
+# updating a rectangle and asking for the total brightness of a rectangle
+# - nodes cover the half-open block [row_start, row_stop) x
+#   [col_start, col_stop) and get split in (up to) 4 children only when an
+#   update or query covers them partially; a node without children is
+#   uniform (all its lights have the same value), and children that end up
+#   uniform with the same value get merged back into their parent
+# - NOTE: an update or query visits the nodes along the rectangle's edges,
+#   which is O(side length) nodes, not polylogarithmic (e.g. a 1-row strip
+#   across a 2**20 x 2**20 grid visits millions of nodes); that's the price
+#   of supporting toggle/on/off and clipped decreases, which don't fit the
+#   polylog 2d structures (like 2d fenwick trees, which only handle adds)
+
+
+def slice_bounds(slice_, size):
+    start, stop, _ = slice_.indices(size)
+    return start, max(start, stop)
+
+
+class RangeTreeGrid:
+    # base class; subclasses say how their nodes store, update and combine
+    # values through `_new_node`, `_apply`, `_push` and `_pull`
+    takes_rectangles = True
+    
+    def __init__(self, width=1000, height=1000):
+        self.width = width
+        self.height = height
+        self._root = self._new_node(0, height, 0, width, 0)
+    
+    def _split(self, node, value):
+        # create the node's children, all with uniform `value`
+        row_mid = (node.row_start + node.row_stop) // 2
+        col_mid = (node.col_start + node.col_stop) // 2
+        row_ranges = [(node.row_start, row_mid), (row_mid, node.row_stop)]
+        col_ranges = [(node.col_start, col_mid), (col_mid, node.col_stop)]
+        node.children = [self._new_node(row_start, row_stop,
+                                        col_start, col_stop, value)
+                         for row_start, row_stop in row_ranges
+                         for col_start, col_stop in col_ranges
+                         if row_start < row_stop and col_start < col_stop]
+    
+    def _update(self, node, row_start, row_stop, col_start, col_stop, op):
+        if (row_stop <= node.row_start or node.row_stop <= row_start or
+                col_stop <= node.col_start or node.col_stop <= col_start):
+            return
+        if (row_start <= node.row_start and node.row_stop <= row_stop and
+                col_start <= node.col_start and node.col_stop <= col_stop and
+                self._apply(node, op)):
+            return
+        self._push(node)
+        for child in node.children:
+            self._update(child, row_start, row_stop, col_start, col_stop, op)
+        self._pull(node)
+    
+    def _query(self, node, row_start, row_stop, col_start, col_stop):
+        overlap_rows = (min(row_stop, node.row_stop) -
+                        max(row_start, node.row_start))
+        overlap_cols = (min(col_stop, node.col_stop) -
+                        max(col_start, node.col_start))
+        if overlap_rows <= 0 or overlap_cols <= 0:
+            return 0
+        area = ((node.row_stop - node.row_start) *
+                (node.col_stop - node.col_start))
+        if overlap_rows * overlap_cols == area:
+            return node.sum
+        if node.children is None:
+            return node.sum // area * overlap_rows * overlap_cols
+        self._push(node)
+        return sum(self._query(child, row_start, row_stop,
+                               col_start, col_stop)
+                   for child in node.children)
+    
+    def update(self, rows, cols, op):
+        row_start, row_stop = slice_bounds(rows, self.height)
+        col_start, col_stop = slice_bounds(cols, self.width)
+        self._update(self._root, row_start, row_stop, col_start, col_stop,
+                     op)
+    
+    def brightness(self, rows, cols):
+        # total brightness of the lights in the given rectangle
+        row_start, row_stop = slice_bounds(rows, self.height)
+        col_start, col_stop = slice_bounds(cols, self.width)
+        return self._query(self._root, row_start, row_stop,
+                           col_start, col_stop)
+    
+    def total_brightness(self):
+        return self._root.sum
+
+
+class _SwitchNode:
+    __slots__ = ('row_start', 'row_stop', 'col_start', 'col_stop',
+                 'children', 'sum', 'pending')
+
+
+# what doing `command` after the (pending) `previous_command` amounts to
+compose_switch_commands = {
+    (None, 'toggle'): 'toggle',
+    ('toggle', 'toggle'): None,
+    ('turn_on', 'toggle'): 'turn_off',
+    ('turn_off', 'toggle'): 'turn_on',
+}
+
+
+class LightSwitchTree(RangeTreeGrid):
+    # a range-query grid for the english interpretation (lights are on/off)
+    def _new_node(self, row_start, row_stop, col_start, col_stop, value):
+        node = _SwitchNode()
+        node.row_start, node.row_stop = row_start, row_stop
+        node.col_start, node.col_stop = col_start, col_stop
+        node.children = None
+        node.sum = value * (row_stop - row_start) * (col_stop - col_start)
+        node.pending = None
+        return node
+    
+    def _apply(self, node, command):
+        area = ((node.row_stop - node.row_start) *
+                (node.col_stop - node.col_start))
+        if command == 'turn_on':
+            node.sum = area
+        elif command == 'turn_off':
+            node.sum = 0
+        else:
+            node.sum = area - node.sum
+        # turning on/off overrides whatever was pending
+        node.pending = compose_switch_commands.get((node.pending, command),
+                                                   command)
+        return True
+    
+    def _push(self, node):
+        if node.children is None:
+            area = ((node.row_stop - node.row_start) *
+                    (node.col_stop - node.col_start))
+            self._split(node, node.sum // area)
+        elif node.pending is not None:
+            for child in node.children:
+                self._apply(child, node.pending)
+        node.pending = None
+    
+    def _pull(self, node):
+        node.sum = sum(child.sum for child in node.children)
+        area = ((node.row_stop - node.row_start) *
+                (node.col_stop - node.col_start))
+        if ((node.sum == 0 or node.sum == area) and
+                all(child.children is None for child in node.children)):
+            # all lights are off (or all on); no need for the children
+            node.children = None
+    
+    def toggle(self, rows, cols):
+        self.update(rows, cols, 'toggle')
+    
+    def turn_on(self, rows, cols):
+        self.update(rows, cols, 'turn_on')
+    
+    def turn_off(self, rows, cols):
+        self.update(rows, cols, 'turn_off')
+
+
+class _BrightnessNode:
+    __slots__ = ('row_start', 'row_stop', 'col_start', 'col_stop',
+                 'children', 'sum', 'min', 'min_count', 'second_min',
+                 'pending_add')
+
+
+infinity = float('inf')
+
+
+class BrightnessTree(RangeTreeGrid):
+    # a range-query grid for the elvish interpretation
+    # - decreasing brightness clips at 0, i.e. it's "add -1" followed by
+    #   "raise everything below 0 to 0"; a plain sum can't handle the
+    #   latter, so nodes also keep their minimum, how many lights have it
+    #   and the second smallest value (a.k.a. "segment tree beats")
+    def _new_node(self, row_start, row_stop, col_start, col_stop, value):
+        node = _BrightnessNode()
+        node.row_start, node.row_stop = row_start, row_stop
+        node.col_start, node.col_stop = col_start, col_stop
+        node.children = None
+        node.min_count = (row_stop - row_start) * (col_stop - col_start)
+        node.sum = value * node.min_count
+        node.min = value
+        node.second_min = infinity
+        node.pending_add = 0
+        return node
+    
+    def _apply(self, node, op):
+        kind, amount = op
+        if kind == 'add':
+            area = ((node.row_stop - node.row_start) *
+                    (node.col_stop - node.col_start))
+            node.sum += amount * area
+            node.min += amount
+            node.second_min += amount
+            node.pending_add += amount
+            return True
+        # kind == 'raise_to': raise every light below `amount` to `amount`
+        if node.min >= amount:
+            return True
+        if node.second_min > amount:
+            # only the lights at the minimum change
+            node.sum += (amount - node.min) * node.min_count
+            node.min = amount
+            return True
+        # several different values change; go deeper
+        return False
+    
+    def _push(self, node):
+        if node.children is None:
+            self._split(node, node.min)
+        else:
+            for child in node.children:
+                if node.pending_add:
+                    self._apply(child, ('add', node.pending_add))
+                if child.min < node.min:
+                    self._apply(child, ('raise_to', node.min))
+        node.pending_add = 0
+    
+    def _pull(self, node):
+        children = node.children
+        node.sum = sum(child.sum for child in children)
+        node.min = min(child.min for child in children)
+        node.min_count = sum(child.min_count for child in children
+                             if child.min == node.min)
+        node.second_min = min(child.second_min if child.min == node.min
+                              else child.min for child in children)
+        if (node.second_min == infinity and
+                all(child.children is None for child in children)):
+            # all lights are equally bright; no need for the children
+            node.children = None
+    
+    def increase_brightness_by_1(self, rows, cols):
+        self.update(rows, cols, ('add', 1))
+    
+    def decrease_brightness_by_1(self, rows, cols):
+        self.update(rows, cols, ('add', -1))
+        self.update(rows, cols, ('raise_to', 0))
+    
+    def increase_brightness_by_2(self, rows, cols):
+        self.update(rows, cols, ('add', 2))
+
+
+def replay(grid, instructions, command_interpreter, regions):
+    # apply the instructions one by one and, after each one, yield the
+    # brightness of every (rows, cols) region in `regions`
+    instruction_applier = RectangleInstructionApplier(grid,
+                                                      command_interpreter)
+    for instruction in instructions:
+        instruction_applier.apply_(instruction)
+        yield [grid.brightness(rows, cols) for rows, cols in regions]
+
+
+# how much each grid method can raise a light's brightness (beyond 1)
+brightness_increase_for = {
+    'increase_brightness_by_1': 1,
+    'increase_brightness_by_2': 2,
+}
+
+
+def max_brightness(instructions, command_interpreter):
+    # an upper bound for any light's brightness after all instructions
+    return max(1, sum(brightness_increase_for.get(command_interpreter(
+                          ins.command), 0) for ins in instructions))
+
+
+def smallest_cell_type_for(max_value):
+    for cell_type, cell_max in (('bit', 1), ('uint8', 2**8 - 1),
+                                ('uint16', 2**16 - 1), ('uint32', 2**32 - 1)):
+        if max_value <= cell_max:
+            return cell_type
+    raise OverflowError('no Grid cell type can hold {}'.format(max_value))
+
+
+def smallest_dtype_for(max_value):
+    for dtype in (numpy.uint8, numpy.uint16, numpy.uint32, numpy.uint64):
+        if max_value <= numpy.iinfo(dtype).max:
+            return dtype
+    raise OverflowError('no numpy dtype can hold {}'.format(max_value))
+
+
+def solve_all(instructions, command_interpreters):
+    # solve for every interpreter in a single pass over the instructions,
+    # keeping each grid in the smallest integer type that fits
+    applier = FusedInstructionApplier()
+    grids = []
+    for command_interpreter in command_interpreters:
+        brightest = max_brightness(instructions, command_interpreter)
+        if numpy is not None:
+            grid = ArrayGrid(dtype=smallest_dtype_for(brightest))
+        else:
+            grid = Grid(cell_type=smallest_cell_type_for(brightest))
+        applier.register(grid, command_interpreter)
+        grids.append(grid)
+    applier.apply_all(instructions)
+    return [grid.total_brightness() for grid in grids]
+
+
+# coordinate compression: the edges of all instructions' rectangles cut the
+# plane into blocks of lights that always have the same state, so we only
+# need one cell per block; the work depends on the number of instructions
+# instead of the size of the grid
+
+
+def compress(instructions):
+    # return the instructions rewritten to work on the grid of blocks, plus
+    # the blocks' heights and widths
+    xs = sorted({ins.left for ins in instructions} |
+                {ins.right + 1 for ins in instructions})
+    ys = sorted({ins.down for ins in instructions} |
+                {ins.up + 1 for ins in instructions})
+    x_index = {x: index for index, x in enumerate(xs)}
+    y_index = {y: index for index, y in enumerate(ys)}
+    compressed = [Instruction('{} {},{} through {},{}'.format(
+                      ins.command, x_index[ins.left], y_index[ins.down],
+                      x_index[ins.right + 1] - 1, y_index[ins.up + 1] - 1))
+                  for ins in instructions]
+    heights = [y2 - y1 for y1, y2 in zip(ys, ys[1:])]
+    widths = [x2 - x1 for x1, x2 in zip(xs, xs[1:])]
+    return compressed, heights, widths
+
+
+def solve_compressed(instructions, command_interpreter):
+    compressed, heights, widths = compress(instructions)
+    if numpy is not None:
+        grid = ArrayGrid(width=len(widths), height=len(heights))
+        instruction_applier = RectangleInstructionApplier(grid,
+                                                          command_interpreter)
+    else:
+        grid = Grid(width=len(widths), height=len(heights))
+        instruction_applier = InstructionApplier(grid, command_interpreter)
+    instruction_applier.apply_all(compressed)
+    return grid.weighted_brightness(heights, widths)
+
+
 def main(filename=None):
     # get the input file
     if filename is None:
@@ -140,8 +796,11 @@ def main(filename=None):
             return 1
     with open(filename, 'r') as f:
         instructions = [Instruction(line) for line in f.read().splitlines()]
-    print('part 1:', solve(instructions, interpret_command_in_english))
-    print('part 2:', solve(instructions, interpret_command_in_elvish))
+    answer_to_part_1, answer_to_part_2 = solve_all(
+        instructions, [interpret_command_in_english,
+                       interpret_command_in_elvish])
+    print('part 1:', answer_to_part_1)
+    print('part 2:', answer_to_part_2)
     return 0
 
 
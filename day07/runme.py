@@ -26,6 +26,13 @@ $ runme.py input.txt
 
 import sys
 import re
+import array
+
+try:
+    import numpy
+except ImportError:
+    # no numpy; `evaluate_batch` won't be available
+    numpy = None
 
 
 # bitwise operators we'll use:
@@ -36,12 +43,21 @@ import re
 # - a << b : a LSHIFT b (places)
 
 
+class CircuitCycleError(Exception):
+    def __init__(self, cycle):
+        # the wires in the cycle in signal order; the first is also the last
+        self.cycle = cycle
+    
+    def __str__(self):
+        return 'circuit has a cycle: {}'.format(' -> '.join(self.cycle))
+
+
 class BadInstructionError(Exception):
     def __init__(self, instruction):
         self.instruction = instruction
     
     def __str__(self):
-        return str(instruction)
+        return str(self.instruction)
 
 
 re_parts = {
@@ -101,6 +117,17 @@ class Instruction:
         else:
             return True
     
+    def operation(self):
+        for operation in ('not', 'and', 'or', 'rshift', 'lshift'):
+            if self.matches(operation):
+                return operation
+        return 'val_set'
+    
+    def wire_args(self):
+        # the arguments that are wires (vs numbers)
+        return [arg for arg in (self.l_arg(), self.r_arg())
+                if arg is not None and not is_number(arg)]
+    
     def l_arg(self):
         return self.get('l_arg')
     
@@ -136,27 +163,99 @@ class InstructionResolver:
             return self.val_for[target]
         except KeyError:
             pass
+        # depth-first walk with an explicit stack instead of recursion, so
+        # that deep circuits can't hit the recursion limit
+        # - `path` holds the wires being resolved (each waiting on the next)
+        #   and `pending_args` the inputs each one still has to look at
+        path = [target]
+        on_path = {target}
+        pending_args = [iter(self.ins_for[target].wire_args())]
+        while path:
+            for arg in pending_args[-1]:
+                if arg in self.val_for:
+                    continue
+                if arg in on_path:
+                    # signals flow from the end of the path to its start
+                    cycle = path[path.index(arg):] + [arg]
+                    raise CircuitCycleError(cycle[::-1])
+                path.append(arg)
+                on_path.add(arg)
+                pending_args.append(iter(self.ins_for[arg].wire_args()))
+                break
+            else:
+                # all inputs are resolved
+                wire = path.pop()
+                on_path.remove(wire)
+                pending_args.pop()
+                self.val_for[wire] = self.compute(self.ins_for[wire])
+        return self.val_for[target]
+    
+    def value_of(self, arg):
+        # `arg` is either a number or an already resolved wire
+        try:
+            return int(arg)
+        except ValueError:
+            return self.val_for[arg]
+    
+    def compute(self, ins):
         # compute the result of the instruction
-        ins = self.ins_for[target]
         if ins.is_val_set():
-            result = self.resolve(ins.r_arg())
+            result = self.value_of(ins.r_arg())
         elif ins.is_not():
-            result = to_16_bit(~ self.resolve(ins.r_arg()))
+            result = to_16_bit(~ self.value_of(ins.r_arg()))
         elif ins.is_and():
-            result = to_16_bit(self.resolve(ins.l_arg()) &
-                               self.resolve(ins.r_arg()))
+            result = to_16_bit(self.value_of(ins.l_arg()) &
+                               self.value_of(ins.r_arg()))
         elif ins.is_or():
-            result = to_16_bit(self.resolve(ins.l_arg()) |
-                               self.resolve(ins.r_arg()))
+            result = to_16_bit(self.value_of(ins.l_arg()) |
+                               self.value_of(ins.r_arg()))
         elif ins.is_lshift():
-            result = to_16_bit(self.resolve(ins.l_arg()) <<
-                               self.resolve(ins.r_arg()))
+            result = to_16_bit(self.value_of(ins.l_arg()) <<
+                               self.value_of(ins.r_arg()))
         elif ins.is_rshift():
-            result = to_16_bit(self.resolve(ins.l_arg()) >>
-                               self.resolve(ins.r_arg()))
-        self.val_for[target] = result
+            result = to_16_bit(self.value_of(ins.l_arg()) >>
+                               self.value_of(ins.r_arg()))
         return result
 
+
+class DependencyTrackingResolver(InstructionResolver):
+    # an InstructionResolver that can override a wire's signal and then only
+    # recompute the wires that depend on it
+    def __init__(self, instructions):
+        super().__init__(instructions)
+        # reverse-dependency index: the wires each wire is an input to
+        self.dependents_of = {}
+        for ins in self.instructions:
+            self._add_dependencies(ins)
+    
+    def _add_dependencies(self, ins):
+        for wire in ins.wire_args():
+            self.dependents_of.setdefault(wire, set()).add(ins.out())
+    
+    def _remove_dependencies(self, ins):
+        for wire in ins.wire_args():
+            self.dependents_of[wire].discard(ins.out())
+    
+    def override(self, wire, value):
+        # make `wire` carry `value` no matter what it was connected to
+        if wire in self.ins_for:
+            self._remove_dependencies(self.ins_for[wire])
+        self.ins_for[wire] = Instruction('{} -> {}'.format(value, wire))
+        self.invalidate(wire)
+    
+    def invalidate(self, wire):
+        # forget the memoized signal of `wire` and of everything downstream
+        # - a wire can only be memoized if all its inputs are, so we can
+        #   stop at dependents that aren't memoized
+        self.val_for.pop(wire, None)
+        stack = [wire]
+        while stack:
+            for dependent in self.dependents_of.get(stack.pop(), ()):
+                if dependent in self.val_for:
+                    del self.val_for[dependent]
+                    stack.append(dependent)
+
+
 # mask used to limit numbers to 16bit
 mask = int('1111111111111111', 2)
 
@@ -166,6 +265,353 @@ def to_16_bit(number):
     return number & mask
 
 
+# compact parsed form of a circuit: wires get interned to dense integer ids
+# and gates are stored in parallel arrays as
+# (opcode, left operand kind/value, right operand kind/value, output id)
+
+
+SET, NOT, AND, OR, LSHIFT, RSHIFT = range(6)
+opcode_for = {'NOT': NOT, 'AND': AND, 'OR': OR, 'LSHIFT': LSHIFT,
+              'RSHIFT': RSHIFT}
+
+# operand kinds; a CONST operand's value is the number itself, a WIRE
+# operand's value is the wire's id
+CONST, WIRE = range(2)
+
+# what every opcode computes, given its left and right operand values
+operation_for_opcode = (
+    lambda l, r: r,
+    lambda l, r: ~r & mask,
+    lambda l, r: l & r & mask,
+    lambda l, r: (l | r) & mask,
+    lambda l, r: (l << r) & mask,
+    lambda l, r: (l >> r) & mask,
+)
+
+
+class CompactCircuit:
+    def __init__(self, lines):
+        self.wire_names = []
+        self.wire_id = {}
+        self.opcodes = array.array('B')
+        self.l_kinds = array.array('B')
+        self.l_values = array.array('q')
+        self.r_kinds = array.array('B')
+        self.r_values = array.array('q')
+        self.outputs = array.array('q')
+        for line in lines:
+            self._add_gate(line)
+        # the gate driving each wire (-1 if none), and each wire's signal
+        # (-1 until it's resolved)
+        self.gate_for = array.array('q', [-1]) * len(self.wire_names)
+        for gate, output in enumerate(self.outputs):
+            self.gate_for[output] = gate
+        self.values = array.array('q', [-1]) * len(self.wire_names)
+    
+    def _intern(self, name):
+        try:
+            return self.wire_id[name]
+        except KeyError:
+            self.wire_id[name] = len(self.wire_names)
+            self.wire_names.append(name)
+            return self.wire_id[name]
+    
+    def _operand(self, token):
+        if token.isdigit():
+            return CONST, int(token)
+        return WIRE, self._intern(token)
+    
+    def _add_gate(self, line):
+        # forms: 'x -> out', 'NOT x -> out' and 'x OP y -> out'
+        tokens = line.split()
+        if len(tokens) == 3 and tokens[1] == '->':
+            opcode, l_operand, r_operand = SET, (CONST, 0), tokens[0]
+        elif len(tokens) == 4 and tokens[0] == 'NOT' and tokens[2] == '->':
+            opcode, l_operand, r_operand = NOT, (CONST, 0), tokens[1]
+        elif (len(tokens) == 5 and tokens[1] in opcode_for and
+                tokens[1] != 'NOT' and tokens[3] == '->'):
+            opcode = opcode_for[tokens[1]]
+            l_operand, r_operand = self._operand(tokens[0]), tokens[2]
+        else:
+            raise BadInstructionError(line)
+        r_kind, r_value = self._operand(r_operand)
+        self.opcodes.append(opcode)
+        self.l_kinds.append(l_operand[0])
+        self.l_values.append(l_operand[1])
+        self.r_kinds.append(r_kind)
+        self.r_values.append(r_value)
+        self.outputs.append(self._intern(tokens[-1]))
+    
+    def input_wires(self, gate):
+        wires = []
+        if self.l_kinds[gate] == WIRE:
+            wires.append(self.l_values[gate])
+        if self.r_kinds[gate] == WIRE:
+            wires.append(self.r_values[gate])
+        return wires
+    
+    def _open_path(self, stack, is_open, start):
+        # the chain of open wires from the top of the stack down to `start`,
+        # which is an input of the top one (so it's a cycle, in signal
+        # order); a wire's last entry on the stack is the one we opened
+        path = []
+        for wire in reversed(stack):
+            if is_open[wire] and wire not in path:
+                path.append(wire)
+            if wire == start:
+                break
+        return path + [path[0]]
+    
+    def topological_order(self):
+        # gate indices ordered so that each gate comes after the gates
+        # driving its inputs (Kahn's algorithm)
+        num_gates = len(self.opcodes)
+        num_missing_inputs = array.array('q', [0]) * num_gates
+        gates_fed_by = [[] for _ in self.wire_names]
+        for gate in range(num_gates):
+            for wire in self.input_wires(gate):
+                if self.gate_for[wire] >= 0:
+                    num_missing_inputs[gate] += 1
+                    gates_fed_by[wire].append(gate)
+        ready = [gate for gate in range(num_gates)
+                 if num_missing_inputs[gate] == 0]
+        order = []
+        while ready:
+            gate = ready.pop()
+            order.append(gate)
+            for fed_gate in gates_fed_by[self.outputs[gate]]:
+                num_missing_inputs[fed_gate] -= 1
+                if num_missing_inputs[fed_gate] == 0:
+                    ready.append(fed_gate)
+        if len(order) < num_gates:
+            # any gate left depends on a cycle; resolving it reports it
+            gate = next(gate for gate in range(num_gates)
+                        if num_missing_inputs[gate] > 0)
+            self.resolve(self.wire_names[self.outputs[gate]])
+        return order
+    
+    def resolve(self, target):
+        values = self.values
+        gate_for = self.gate_for
+        wire = self.wire_id[target]
+        # iterative depth-first walk; a wire is "open" from when we first
+        # look at its inputs until we compute it, and the open wires are
+        # always a chain of wires each waiting on the next
+        is_open = bytearray(len(values))
+        stack = [wire]
+        while stack:
+            wire = stack[-1]
+            if values[wire] >= 0:
+                stack.pop()
+                continue
+            gate = gate_for[wire]
+            if gate < 0:
+                raise KeyError(self.wire_names[wire])
+            if not is_open[wire]:
+                is_open[wire] = 1
+                for input_wire in self.input_wires(gate):
+                    if values[input_wire] >= 0:
+                        continue
+                    if is_open[input_wire]:
+                        cycle = self._open_path(stack, is_open, input_wire)
+                        raise CircuitCycleError(
+                            [self.wire_names[w] for w in cycle])
+                    stack.append(input_wire)
+                continue
+            # all inputs are resolved; dispatch on the opcode
+            l_value = self.l_values[gate]
+            if self.l_kinds[gate] == WIRE:
+                l_value = values[l_value]
+            r_value = self.r_values[gate]
+            if self.r_kinds[gate] == WIRE:
+                r_value = values[r_value]
+            values[wire] = operation_for_opcode[self.opcodes[gate]](l_value,
+                                                                    r_value)
+            is_open[wire] = 0
+            stack.pop()
+        return values[self.wire_id[target]]
+
+
+def evaluate_batch(circuit, inputs, target='a'):
+    # evaluate a CompactCircuit for a whole batch of inputs at once
+    # - `inputs` maps wire names to sequences of signals (all of the same
+    #   length); those wires ignore whatever drives them in the circuit
+    # - every gate works on numpy uint16 arrays, which gives the same
+    #   results as `to_16_bit`; the scalar resolvers pass constants over
+    #   16bit through unmasked (e.g. `70000 -> q` gives 70000), which
+    #   uint16 can't hold, so circuits with such constants raise ValueError
+    # - returns an array with the target's signal for every input
+    batch_size = len(next(iter(inputs.values()))) if inputs else 1
+    signals = {circuit.wire_id[name]:
+                   (numpy.asarray(values) & mask).astype(numpy.uint16)
+               for name, values in inputs.items()}
+    for kinds, values in ((circuit.l_kinds, circuit.l_values),
+                          (circuit.r_kinds, circuit.r_values)):
+        for gate, (kind, value) in enumerate(zip(kinds, values)):
+            output = circuit.outputs[gate]
+            if kind == CONST and value > mask and output not in signals:
+                raise ValueError(
+                    'constant {} (for wire {}) does not fit in 16 bits'
+                    .format(value, circuit.wire_names[output]))
+    target_wire = circuit.wire_id[target]
+    # how many gates still need each wire, so we can free its signals early
+    num_uses_left = [0] * len(circuit.wire_names)
+    order = circuit.topological_order()
+    for gate in order:
+        for wire in circuit.input_wires(gate):
+            num_uses_left[wire] += 1
+    
+    def operand(kind, value):
+        if kind == CONST:
+            return numpy.uint16(value)
+        return signals[value]
+    
+    for gate in order:
+        output = circuit.outputs[gate]
+        if output not in signals:
+            opcode = circuit.opcodes[gate]
+            l = operand(circuit.l_kinds[gate], circuit.l_values[gate])
+            r = operand(circuit.r_kinds[gate], circuit.r_values[gate])
+            if opcode == SET:
+                result = r
+            elif opcode == NOT:
+                result = ~r
+            elif opcode == AND:
+                result = l & r
+            elif opcode == OR:
+                result = l | r
+            else:
+                # shift in 32 bits; shifting 16+ places gives 0 either way
+                l = numpy.asarray(l).astype(numpy.uint32)
+                r = numpy.minimum(r, 16).astype(numpy.uint32)
+                if opcode == LSHIFT:
+                    result = (l << r) & mask
+                else:
+                    result = l >> r
+                result = result.astype(numpy.uint16)
+            signals[output] = result
+        for wire in circuit.input_wires(gate):
+            num_uses_left[wire] -= 1
+            if num_uses_left[wire] == 0 and wire != target_wire:
+                signals.pop(wire, None)
+    return numpy.broadcast_to(signals[target_wire], (batch_size,)).copy()
+
+
+def topological_order(instructions):
+    # return the instructions ordered so that each one comes after the ones
+    # producing its input wires (Kahn's algorithm)
+    ins_for = { ins.out(): ins for ins in instructions }
+    num_missing_inputs = {}
+    dependents_of = {}
+    for ins in instructions:
+        input_wires = [wire for wire in ins.wire_args() if wire in ins_for]
+        num_missing_inputs[ins.out()] = len(input_wires)
+        for wire in input_wires:
+            dependents_of.setdefault(wire, []).append(ins.out())
+    ready = [wire for wire, count in num_missing_inputs.items() if count == 0]
+    order = []
+    while ready:
+        wire = ready.pop()
+        order.append(ins_for[wire])
+        for dependent in dependents_of.get(wire, []):
+            num_missing_inputs[dependent] -= 1
+            if num_missing_inputs[dependent] == 0:
+                ready.append(dependent)
+    if len(order) < len(ins_for):
+        # every wire left has an input that's also left, so following those
+        # inputs from any of them must eventually go round a cycle
+        wire = next(wire for wire, count in num_missing_inputs.items()
+                    if count > 0)
+        path = []
+        seen = {}
+        while wire not in seen:
+            seen[wire] = len(path)
+            path.append(wire)
+            wire = next(arg for arg in ins_for[wire].wire_args()
+                        if num_missing_inputs.get(arg, 0) > 0)
+        cycle = path[seen[wire]:] + [wire]
+        raise CircuitCycleError(cycle[::-1])
+    return order
+
+
+def wires_needed_for(instructions, target):
+    # the target wire and every wire it (transitively) depends on
+    ins_for = { ins.out(): ins for ins in instructions }
+    needed = {target}
+    stack = [target]
+    while stack:
+        for wire in ins_for[stack.pop()].wire_args():
+            if wire not in needed:
+                needed.add(wire)
+                stack.append(wire)
+    return needed
+
+
+# python expressions for every operation (all results get limited to 16bit
+# just like `InstructionResolver.resolve` does)
+expression_for = {
+    'val_set': '{r}',
+    'not':     '~{r} & {mask}',
+    'and':     '{l} & {r} & {mask}',
+    'or':      '({l} | {r}) & {mask}',
+    'lshift':  '({l} << {r}) & {mask}',
+    'rshift':  '({l} >> {r}) & {mask}',
+}
+
+
+def python_name(arg):
+    # prefix wire names so they don't clash with keywords (e.g. 'if', 'in')
+    return arg if is_number(arg) else 'w_' + arg
+
+
+def circuit_source(instructions, target='a'):
+    # python source for a function that computes `target` with one line per
+    # gate; wires set straight from a number become keyword arguments (with
+    # that number as default) so they can be changed on every call
+    needed = wires_needed_for(instructions, target)
+    order = [ins for ins in topological_order(instructions)
+             if ins.out() in needed]
+    inputs = [ins for ins in order
+              if ins.is_val_set() and is_number(ins.r_arg())]
+    input_wires = {ins.out() for ins in inputs}
+    lines = ['def circuit({}):'.format(', '.join(
+        '{}={}'.format(python_name(ins.out()), ins.r_arg())
+        for ins in inputs))]
+    for ins in order:
+        if ins.out() in input_wires:
+            continue
+        expression = expression_for[ins.operation()].format(
+            l=python_name(ins.l_arg() or '0'), r=python_name(ins.r_arg()),
+            mask=mask)
+        lines.append('    {} = {}'.format(python_name(ins.out()),
+                                          expression))
+    lines.append('    return {}'.format(python_name(target)))
+    return '\n'.join(lines) + '\n'
+
+
+# compiled circuits, by (instruction strings, target)
+compiled_circuits = {}
+
+
+def compile_circuit(instructions, target='a'):
+    # return a function that computes the target wire's signal; call it
+    # with keyword arguments `w_<wire>=<signal>` to change input wires
+    key = (tuple(ins.string for ins in instructions), target)
+    try:
+        return compiled_circuits[key]
+    except KeyError:
+        pass
+    code = compile(circuit_source(instructions, target), '<circuit>', 'exec')
+    namespace = {}
+    exec(code, namespace)
+    compiled_circuits[key] = namespace['circuit']
+    return compiled_circuits[key]
+
+
+def solve_compact(lines, target='a'):
+    return CompactCircuit(lines).resolve(target)
+
+
 def solve(instructions, target='a'):
     instruction_resolver = InstructionResolver(instructions)
     result = instruction_resolver.resolve(target)
@@ -185,16 +631,15 @@ def main(filename=None):
     # read the instructions
     with open(filename, 'r') as f:
         instructions = [Instruction(line) for line in f.read().splitlines()]
+    instruction_resolver = DependencyTrackingResolver(instructions)
     # solve part 1
-    signal_from_part_1 = solve(instructions, target='a')
+    signal_from_part_1 = instruction_resolver.resolve('a')
     print('part 1:', signal_from_part_1)
-    # alter the input of wire b to equal the signal we got on part 1
-    for index, instruction in enumerate(instructions):
-        if instruction.out() == 'b':
-            break
-    instructions[index] = Instruction('{} -> b'.format(signal_from_part_1))
+    # alter the input of wire b to equal the signal we got on part 1; only
+    # the wires that depend on b get recomputed
+    instruction_resolver.override('b', signal_from_part_1)
     # solve part 2
-    print('part 2:', solve(instructions, target='a'))
+    print('part 2:', instruction_resolver.resolve('a'))
     return 0
 
 
@@ -21,11 +21,19 @@ $ python3 runme.py input.txt
 or
 $ runme.py input.txt
 (where input.txt is the input file and $ the prompt)
+
+for huge inputs, process a memory-mapped file in parallel shards:
+$ python3 runme.py --workers 8 input.txt
 """
 
 
 import sys
+import os
 import re
+import mmap
+import argparse
+import itertools
+import concurrent.futures
 
 
 def clean_up(line):
@@ -52,6 +60,87 @@ def unclean_up(line):
     return line
 
 
+# an escape sequence: \\, \" or \x followed by two hex digits (the group
+# captures the 'x' so we can tell those apart)
+re_escape_sequence = re.compile(r'\\(?:[\\"]|(x)[0-9a-fA-F]{2})')
+
+
+# the characters (and regex) `lengths` needs, for str and for bytes text
+symbols_for = {
+    str: ('\n', '\\', '"', 'x', re_escape_sequence),
+    bytes: (b'\n', b'\\', b'"', b'x',
+            re.compile(re_escape_sequence.pattern.encode('ascii'))),
+}
+
+
+def lengths(text):
+    # return the total code length, in-memory length and re-escaped length
+    # of the lines in `text` (str or bytes), working on the text as is (no
+    # splitting, and no cleaned up or re-escaped copies of it)
+    newline, backslash, double_quote, x, re_escape = symbols_for[type(text)]
+    num_lines = text.count(newline)
+    if text and not text.endswith(newline):
+        num_lines += 1
+    code_length = len(text) - text.count(newline)
+    # every escape sequence stands for a single character in memory, and
+    # every line loses its surrounding double quotes
+    # NOTE: findall only returns the captured 'x' (or ''), and python
+    #   caches one-character strings and bytes, so this doesn't copy the
+    #   text
+    escapes = re_escape.findall(text)
+    chars_saved = len(escapes) + 2 * escapes.count(x)
+    in_memory_length = code_length - 2 * num_lines - chars_saved
+    # re-escaping adds a backslash before every backslash and double quote,
+    # plus a new pair of surrounding double quotes per line
+    escaped_length = (code_length + 2 * num_lines + text.count(backslash) +
+                      text.count(double_quote))
+    return code_length, in_memory_length, escaped_length
+
+
+# sharded mode: split a memory-mapped file in newline-aligned byte ranges
+# and work out each range's lengths on a process pool, straight from the
+# bytes
+
+
+default_shard_size = 16 * 1024 * 1024
+
+
+def shard_bounds(data, shard_size=default_shard_size):
+    # split `data` in (start, end) ranges that end right after a newline
+    bounds = []
+    start = 0
+    while start < len(data):
+        newline = data.find(b'\n', min(start + shard_size, len(data)) - 1)
+        end = len(data) if newline == -1 else newline + 1
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def shard_lengths(filename, start, end):
+    with open(filename, 'rb') as file_:
+        with mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return lengths(data[start:end])
+
+
+def solve_sharded(filename, num_workers=None,
+                  shard_size=default_shard_size):
+    # return the part 1 and part 2 answers
+    if os.path.getsize(filename) == 0:
+        return 0, 0
+    with open(filename, 'rb') as file_:
+        with mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            bounds = shard_bounds(data, shard_size)
+    delta_part_1 = delta_part_2 = 0
+    with concurrent.futures.ProcessPoolExecutor(num_workers) as executor:
+        all_lengths = executor.map(shard_lengths, itertools.repeat(filename),
+                                   *zip(*bounds))
+        for code_length, in_memory_length, escaped_length in all_lengths:
+            delta_part_1 += code_length - in_memory_length
+            delta_part_2 += escaped_length - code_length
+    return delta_part_1, delta_part_2
+
+
 def solve_part_1(lines):
     total_code_length = sum(len(line) for line in lines)
     total_in_memory_length = sum(len(clean_up(line)) for line in lines)
@@ -64,20 +153,40 @@ def solve_part_2(lines):
     return total_escaped_length - total_code_length
 
 
-def main(filename=None):
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='runme.py')
+    parser.add_argument('input_file')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='process the input in parallel shards using '
+                             'this many processes')
+    return parser.parse_args(args)
+
+
+def main(filename=None, num_workers=None):
     # get the input file
     if filename is None:
-        if len(sys.argv) == 2:
-            # get the filename from the command line
-            filename = sys.argv[1]
+        if len(sys.argv) >= 2:
+            # get the filename (and options) from the command line
+            args = parse_args(sys.argv[1:])
+            filename = args.input_file
+            num_workers = args.workers
         else:
             # no filename given
-            print('Usage: runme.py input_file')
+            print('Usage: runme.py [--workers N] input_file')
             return 1
+    if num_workers is not None:
+        # huge inputs: work on the memory-mapped file in parallel shards
+        answer_to_part_1, answer_to_part_2 = solve_sharded(filename,
+                                                           num_workers)
+        print('part 1:', answer_to_part_1)
+        print('part 2:', answer_to_part_2)
+        return 0
     with open(filename, 'r') as file_:
-        lines = file_.read().splitlines()
-    print('part 1:', solve_part_1(lines))
-    print('part 2:', solve_part_2(lines))
+        text = file_.read()
+    # work out all three lengths in one go
+    code_length, in_memory_length, escaped_length = lengths(text)
+    print('part 1:', code_length - in_memory_length)
+    print('part 2:', escaped_length - code_length)
     return 0
 
 